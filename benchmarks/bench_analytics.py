@@ -0,0 +1,75 @@
+# Benchmark: trend analysis over memory-mapped daily columns (no database involved).
+# Usage: python benchmarks/bench_analytics.py [--users 1000] [--days 3650] [--iterations 5]
+import argparse
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_calculators import load_tracker
+
+# Function to build random daily columns: most days have meals, some a workout, a few a weigh-in
+def make_columns(users, days, seed=42):
+    rng = np.random.default_rng(seed)
+    logged = rng.random((users, days)) < 0.9
+    user_rows, day_numbers = np.nonzero(logged)
+    rows = len(user_rows)
+    start_weights = rng.uniform(60, 110, users)
+    weights = start_weights[user_rows] - day_numbers * rng.normal(0.005, 0.003, users)[user_rows] + rng.normal(0, 0.4, rows)
+    weights[rng.random(rows) < 0.6] = np.nan
+    burned = rng.uniform(150, 600, rows) * (rng.random(rows) < 0.4)
+    day_columns = {
+        'user_id': user_rows.astype(np.int64) + 1,
+        'day': np.datetime64('2016-01-01') + day_numbers,
+        'calories': rng.normal(2300, 350, rows),
+        'protein': rng.normal(120, 25, rows),
+        'carbs': rng.normal(260, 50, rows),
+        'fats': rng.normal(80, 15, rows),
+        'meal_count': rng.integers(1, 5, rows).astype(np.float64),
+        'calories_burned': burned,
+        'workout_count': (burned > 0).astype(np.float64),
+        'weight': weights,
+    }
+    user_columns = {
+        'user_id': np.arange(1, users + 1, dtype=np.int64),
+        'goal_weight': start_weights - rng.uniform(2, 15, users),
+        'gender': rng.choice(['male', 'female'], users),
+        'height': rng.uniform(150, 200, users),
+        'age': rng.integers(18, 70, users).astype(np.float64),
+        'activity_level': rng.choice(['sedentary', 'lightly active', 'moderately active'], users),
+    }
+    return day_columns, user_columns
+
+def main():
+    parser = argparse.ArgumentParser(description='Trend analysis benchmark over memory-mapped daily columns.')
+    parser.add_argument('--users', type=int, default=1000, help='Users in the random columns.')
+    parser.add_argument('--days', type=int, default=3650, help='Days of history per user.')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed runs of the analysis.')
+    args = parser.parse_args()
+    users, days = args.users, args.days
+    load_tracker()
+    from fitness_tracker import analytics
+
+    with tempfile.TemporaryDirectory() as directory:
+        analytics.save_columns(directory, *make_columns(users, days))
+        start = time.perf_counter()
+        day_columns, user_columns = analytics.open_columns(directory)
+        open_seconds = time.perf_counter() - start
+        timings = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            report = analytics.analyze(day_columns, user_columns)
+            timings.append(time.perf_counter() - start)
+        rows = len(day_columns['user_id'])
+        on_track = int(np.sum(~np.isnat(report['ema_goal_date'])))
+        del day_columns, user_columns, report  # release the memory-mapped files before the folder is removed
+
+    print(f"users: {users}, days: {days}, rows: {rows}")
+    print(f"open columns: {open_seconds * 1000:.1f} ms")
+    print(f"analyze: best {min(timings) * 1000:.0f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.0f} ms")
+    print(f"users on track for their goal (EMA): {on_track}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
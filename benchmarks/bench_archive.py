@@ -0,0 +1,111 @@
+# Benchmark: file size and scan speed before and after archiving a multi-year history.
+# Seeds `users` users with `years` years of meals (4 a day) and workouts (4 a week, 4 exercises each),
+# archives everything older than the retention period, vacuums, and runs the same scans again.
+# Usage: python benchmarks/bench_archive.py [--users 10] [--years 5] [--retention-days 365] [--iterations 5]
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench_calculators import load_tracker
+
+# Meals are logged from recipes, so each one has the same name and nutrition values every time
+MEALS = [(f"{dish} with {side}", 300 + 37 * n % 450, 10 + 7 * n % 45, 20 + 13 * n % 90, 5 + 3 * n % 30)
+         for n, (dish, side) in enumerate((dish, side) for dish in (
+             'Grilled chicken breast', 'Salmon fillet', 'Beef stir fry', 'Vegetable omelette',
+             'Turkey sandwich', 'Lentil curry', 'Greek yogurt bowl', 'Tuna pasta salad')
+             for side in ('brown rice', 'sweet potato', 'quinoa', 'mixed greens', 'wholegrain toast', 'berries'))]
+EXERCISES = ['squat', 'bench press', 'deadlift', 'rowing', 'push up', 'pull up', 'lunge', 'cycling']
+
+# Function to fill the users' tables with `years` years of history ending today; workouts go through the
+# same batch calculation as logged ones
+def seed(tracker, users, years):
+    rng = random.Random(42)
+    today = datetime.date.today()
+    days = [today - datetime.timedelta(days=n) for n in range(int(years * 365), -1, -1)]
+    for user_id in range(1, users + 1):
+        weight_kg = rng.choice(range(60, 100, 5))
+        meals, sessions = [], []
+        for day in days:
+            for hour in (8, 12, 16, 19):
+                meals.append((user_id, *rng.choice(MEALS), f"{day} {hour:02d}:{rng.randrange(60):02d}:00"))
+            if day.weekday() in (0, 2, 4, 5):
+                sessions.append([(name, weight_kg, rng.randint(3, 5), rng.choice((5, 8, 10, 12)))
+                                 for name in rng.sample(EXERCISES, 4)])
+        workout_days = [day.isoformat() for day in days if day.weekday() in (0, 2, 4, 5)]
+        workouts = [(day, total, details) for day, (details, total, _) in
+                    zip(workout_days, tracker.calculate_workouts_batch(sessions))]
+        with tracker.db_transaction(user_id) as cursor:
+            cursor.executemany('''
+                INSERT INTO meals (user_id, name, calories, protein, carbs, fats, logged_at) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', meals)
+            tracker._insert_workouts(cursor, user_id, workouts)
+            tracker.refresh_daily_summary(cursor, user_id=user_id)
+
+# The scans timed before and after archiving: full-table aggregates over the live rows and the recent history
+SCANS = {
+    'meals: totals per user': 'SELECT user_id, COUNT(*), TOTAL(calories) FROM meals GROUP BY user_id',
+    'meals: count per name': 'SELECT name, COUNT(*) FROM meals GROUP BY name',
+    'exercises: calories per name': 'SELECT name, TOTAL(calories_burned) FROM workout_exercises GROUP BY name',
+    'meals: last 30 days, user 1': "SELECT COUNT(*), TOTAL(calories) FROM meals WHERE user_id = 1 AND logged_at >= date('now', '-30 days')",
+}
+
+def time_scans(tracker, repeat=5):
+    timings = {}
+    with tracker.db_connection() as conn:
+        for label, sql in SCANS.items():
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql).fetchall()
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            timings[label] = best
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive benchmark: file size and scan speed before and after.')
+    parser.add_argument('--users', type=int, default=10, help='Users to seed.')
+    parser.add_argument('--years', type=float, default=5, help='Years of history per user.')
+    parser.add_argument('--retention-days', type=int, default=365, help='Days of history kept in the live tables.')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed runs of each scan; the best one is reported.')
+    args = parser.parse_args()
+    users, years, retention_days = args.users, args.years, args.retention_days
+    tracker = load_tracker()
+
+    with tempfile.TemporaryDirectory() as directory:
+        tracker.DB_PATH = os.path.join(directory, 'fitness_tracker.db')
+        tracker.close_db_pool()
+        tracker.setup_database()
+        start = time.perf_counter()
+        seed(tracker, users, years)
+        print(f"Seeded {users} users with {years:g} years of history in {time.perf_counter() - start:.1f} s")
+        before_size = tracker.vacuum_databases()[tracker.DB_PATH][1]
+        before_scans = time_scans(tracker, args.iterations)
+        summary_before = tracker.get_daily_summary(user_id=1)
+
+        start = time.perf_counter()
+        report = tracker.archive_old_rows(retention_days)
+        archive_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        after_size = tracker.vacuum_databases()[tracker.DB_PATH][1]
+        vacuum_seconds = time.perf_counter() - start
+        after_scans = time_scans(tracker, args.iterations)
+
+        print(f"Archived {report['meals']} meals and {report['workouts']} workouts ({report['exercises']} exercises) "
+              f"from {report['days']} days in {archive_seconds:.1f} s; vacuum took {vacuum_seconds:.1f} s")
+        print(f"file size: {before_size / 1e6:.1f} MB -> {after_size / 1e6:.1f} MB ({after_size / before_size:.0%})")
+        for label in SCANS:
+            print(f"{label:32} {before_scans[label] * 1000:8.2f} ms -> {after_scans[label] * 1000:8.2f} ms")
+        print(f"daily summary unchanged: {tracker.get_daily_summary(user_id=1) == summary_before}, "
+              f"matches the raw and archived data: {not tracker.verify_daily_summary()}")
+        tracker.rebuild_daily_summary()
+        print(f"matches after a rebuild from the archive: {not tracker.verify_daily_summary()}")
+        tracker.close_db_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
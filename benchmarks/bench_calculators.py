@@ -0,0 +1,88 @@
+# Benchmark: scalar vs. batch (NumPy) BMR/TDEE/protein/calories calculators.
+# Usage: python benchmarks/bench_calculators.py [--rows 1000000] [--iterations 3]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Function to import the tracker module from this checkout
+def load_tracker():
+    sys.path.insert(0, ROOT)
+    from fitness_tracker import tracker
+    return tracker
+
+# Function to build a random cohort of people and exercises
+def make_rows(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    return {
+        'weights': rng.uniform(45, 140, rows),
+        'heights': rng.uniform(145, 205, rows),
+        'ages': rng.integers(16, 85, rows),
+        'genders': rng.choice(['male', 'female'], rows),
+        'activity_levels': rng.choice(['sedentary', 'lightly active', 'moderately active', 'very active', 'extra active'], rows),
+        'protein_ratios': rng.uniform(1.2, 2.2, rows),
+        'met_values': rng.choice([3.5, 3.8, 5.0, 6.0, 8.0], rows),
+        'sets': rng.integers(1, 6, rows),
+        'reps': rng.integers(5, 20, rows),
+    }
+
+def run_scalar(tracker, data):
+    bmr = [tracker.calculate_bmr(w, h, a, g) for w, h, a, g in
+           zip(data['weights'].tolist(), data['heights'].tolist(), data['ages'].tolist(), data['genders'].tolist())]
+    tdee = [tracker.calculate_tdee(b, level) for b, level in zip(bmr, data['activity_levels'].tolist())]
+    protein = [tracker.calculate_protein_requirement(w, w, r) for w, r in
+               zip(data['weights'].tolist(), data['protein_ratios'].tolist())]
+    # calculate_calories_burned also looks the MET up by name, so time the same one-row call it makes
+    calories = [float(tracker.calculate_calories_burned_batch([m], [w], [s], [r])[0]) for m, w, s, r in
+                zip(data['met_values'].tolist(), data['weights'].tolist(), data['sets'].tolist(), data['reps'].tolist())]
+    return np.array(bmr), np.array(tdee), np.array(protein), np.array(calories)
+
+def run_batch(tracker, data):
+    bmr = tracker.calculate_bmr_batch(data['weights'], data['heights'], data['ages'], data['genders'])
+    tdee = tracker.calculate_tdee_batch(bmr, data['activity_levels'])
+    protein = tracker.calculate_protein_requirement_batch(data['weights'], data['weights'], data['protein_ratios'])
+    calories = tracker.calculate_calories_burned_batch(data['met_values'], data['weights'], data['sets'], data['reps'])
+    return bmr, tdee, protein, calories
+
+# Function to run `function` `iterations` times; returns (its last result, the best time in seconds)
+def best_of(iterations, function, *args):
+    best = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description='Scalar vs. batch (NumPy) calculator benchmark.')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Rows in the random cohort.')
+    parser.add_argument('--iterations', type=int, default=3,
+                        help='Timed runs of each path; the best one is reported.')
+    args = parser.parse_args()
+    rows = args.rows
+    tracker = load_tracker()
+    data = make_rows(rows)
+
+    batch_results, batch_seconds = best_of(args.iterations, run_batch, tracker, data)
+
+    # The scalar path is slow, so time it on a sample and scale up
+    sample = min(rows, 20_000)
+    sample_data = {key: values[:sample] for key, values in data.items()}
+    scalar_results, scalar_seconds = best_of(args.iterations, run_scalar, tracker, sample_data)
+    scalar_seconds *= rows / sample
+
+    identical = all(np.array_equal(s, b[:sample]) for s, b in zip(scalar_results, batch_results))
+    print(f"rows: {rows}, best of {args.iterations} runs")
+    print(f"scalar: {scalar_seconds:.3f} s (extrapolated from {sample} rows)")
+    print(f"batch:  {batch_seconds:.3f} s")
+    print(f"speedup: {scalar_seconds / batch_seconds:.0f}x")
+    print(f"identical results: {identical}")
+    return 0 if identical else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
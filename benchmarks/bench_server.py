@@ -0,0 +1,83 @@
+# Benchmark: load test of the HTTP/JSON server over keep-alive connections.
+# Each client thread keeps one connection open and alternates a paginated GET /meals with a POST /meals;
+# reports throughput, latency percentiles per route and errors, then checks the daily summary.
+# Usage: python benchmarks/bench_server.py [--clients 16] [--requests 4000] [--write-behind]
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from bench_calculators import load_tracker
+
+# Function to send `count` requests over one keep-alive connection; appends (route, seconds, status) to `timings`
+def run_client(port, count, client_id, timings):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    meal = json.dumps({'name': f"Load test meal {client_id}", 'calories': 500, 'protein': 30, 'carbs': 50, 'fats': 15})
+    for n in range(count):
+        start = time.perf_counter()
+        if n % 2:
+            conn.request('POST', '/meals', meal, {'Content-Type': 'application/json'})
+            route = 'POST /meals'
+        else:
+            conn.request('GET', '/meals?limit=20')
+            route = 'GET /meals'
+        response = conn.getresponse()
+        response.read()
+        timings.append((route, time.perf_counter() - start, response.status))
+    conn.close()
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the Fitness Tracker HTTP server.')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent keep-alive connections.')
+    parser.add_argument('--requests', type=int, default=4000, help='Total requests, split over the clients.')
+    parser.add_argument('--write-behind', action='store_true', help='Serve with the write-behind queue on.')
+    args = parser.parse_args()
+
+    tracker = load_tracker()
+    from fitness_tracker import server
+
+    with tempfile.TemporaryDirectory() as directory:
+        tracker.close_db_pool()
+        tracker.DB_PATH = os.path.join(directory, 'bench.db')
+        tracker.DB_SHARD_PATHS = []
+        tracker.setup_database()
+        if args.write_behind:
+            tracker.start_write_behind()
+        httpd = server.TrackerHTTPServer(('127.0.0.1', 0), server.TrackerRequestHandler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+        timings = []
+        per_client = args.requests // args.clients
+        threads = [threading.Thread(target=run_client, args=(httpd.server_address[1], per_client, n, timings))
+                   for n in range(args.clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        httpd.shutdown()
+        httpd.server_close()
+        tracker.stop_write_behind()
+        errors = sum(1 for _, _, status in timings if status >= 400)
+        print(f"{len(timings)} requests from {args.clients} keep-alive clients in {seconds:.2f} s: "
+              f"{len(timings) / seconds:.0f} req/s, {errors} errors")
+        for route in ('GET /meals', 'POST /meals', None):
+            values = sorted(elapsed for name, elapsed, _ in timings if route in (None, name))
+            print(f"{route or 'all':12} p50 {percentile(values, 0.5):7.2f}  p99 {percentile(values, 0.99):7.2f}  "
+                  f"mean {statistics.fmean(values) * 1000:7.2f} ms")
+        print(f"daily summary matches the raw data: {not tracker.verify_daily_summary()}")
+        tracker.close_db_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
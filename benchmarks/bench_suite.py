@@ -0,0 +1,294 @@
+# Benchmark suite: seeds a synthetic database and times the tracker's main data and compute paths.
+# Results (percentiles in ms, peak traced memory) are printed and can be written as JSON, saved as a
+# baseline, and compared against a saved baseline; the run fails if a case got slower than the tolerance allows.
+# Usage:
+#   python benchmarks/bench_suite.py [--scale 1.0] [--repeat 200] [--output results.json]
+#                                    [--save-baseline baseline.json] [--baseline baseline.json] [--tolerance 0.25]
+import argparse
+import builtins
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench_calculators import load_tracker, make_rows
+
+# Rows seeded at --scale 1.0
+SEED_ROWS = {
+    'users': 20,
+    'meals': 100_000,
+    'workouts': 20_000,
+    'exercises_per_workout': 4,
+    'weights': 10_000,
+    'recipes': 5_000,
+}
+SEED_START = datetime.date(2020, 1, 1)
+SEED_DAYS = 4 * 365
+
+MEAL_NAMES = ['Oatmeal', 'Chicken salad', 'Rice bowl', 'Pasta', 'Omelette', 'Smoothie', 'Steak', 'Soup']
+EXERCISES = ['Bench Press', 'Squat', 'Deadlift', 'Pull-ups', 'Push-ups', 'Lunges', 'Rowing', 'Plank']
+# Ingredients for the recipe case; the stubbed API answers each with a fixed food
+RECIPE_INGREDIENTS = ['200g rice', '2 eggs', '150g chicken breast', '1 cup milk', '30g oats', '1 banana']
+
+# Function to fill an empty tracker database with reproducible synthetic rows
+def seed_database(tracker, scale, seed=42):
+    rng = np.random.default_rng(seed)
+    counts = {key: max(int(value * scale), 1) for key, value in SEED_ROWS.items() if key != 'exercises_per_workout'}
+    users = counts['users']
+
+    def days(n):
+        offsets = rng.integers(0, SEED_DAYS, n)
+        return [(SEED_START + datetime.timedelta(days=int(offset))).isoformat() for offset in offsets]
+
+    with tracker.db_transaction() as cursor:
+        meal_days = days(counts['meals'])
+        seconds = rng.integers(0, 24 * 60 * 60, counts['meals'])
+        cursor.executemany(
+            'INSERT INTO meals (user_id, name, calories, protein, carbs, fats, logged_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(int(user_id), MEAL_NAMES[int(name)], float(calories), float(protein), float(carbs), float(fats),
+              f"{day} {second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}")
+             for user_id, name, calories, protein, carbs, fats, day, second in zip(
+                 rng.integers(1, users + 1, counts['meals']), rng.integers(0, len(MEAL_NAMES), counts['meals']),
+                 rng.uniform(100, 900, counts['meals']), rng.uniform(5, 60, counts['meals']),
+                 rng.uniform(10, 120, counts['meals']), rng.uniform(2, 40, counts['meals']),
+                 meal_days, seconds.tolist())],
+        )
+        workout_users = rng.integers(1, users + 1, counts['workouts'])
+        cursor.executemany(
+            'INSERT INTO workouts (id, user_id, date, total_calories_burned) VALUES (?, ?, ?, ?)',
+            [(workout_id, int(user_id), day, float(calories)) for workout_id, (user_id, day, calories) in enumerate(
+                zip(workout_users, days(counts['workouts']), rng.uniform(50, 600, counts['workouts'])), start=1)],
+        )
+        per_workout = SEED_ROWS['exercises_per_workout']
+        cursor.executemany(
+            'INSERT INTO workout_exercises (workout_id, name, duration, calories_burned) VALUES (?, ?, ?, ?)',
+            [(workout_id, EXERCISES[int(rng.integers(0, len(EXERCISES)))], int(rng.integers(10, 60)),
+              float(rng.uniform(10, 150)))
+             for workout_id in range(1, counts['workouts'] + 1) for _ in range(per_workout)],
+        )
+        cursor.executemany(
+            'INSERT INTO weight_history (user_id, date, weight) VALUES (?, ?, ?)',
+            [(int(user_id), day, float(weight)) for user_id, day, weight in zip(
+                rng.integers(1, users + 1, counts['weights']), days(counts['weights']),
+                rng.uniform(55, 110, counts['weights']))],
+        )
+        cursor.executemany(
+            'INSERT INTO recipes (user_id, name, ingredients, calories, protein, carbs, fats) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(int(user_id), f"Recipe {index}", ', '.join(RECIPE_INGREDIENTS[:3]), 650.0, 45.0, 80.0, 15.0)
+             for index, user_id in enumerate(rng.integers(1, users + 1, counts['recipes']), start=1)],
+        )
+        for user_id in range(1, users + 1):
+            tracker._store_profile(cursor, user_id, 'male' if user_id % 2 else 'female', 175.0, 35, 'moderately active')
+            cursor.execute('''
+                INSERT INTO goal_information (user_id, current_weight, goal_weight, goal_protein_ratio,
+                                              calories_difference, protein_difference)
+                VALUES (?, 80, 72, 1.8, 0, 0)
+            ''', (user_id,))
+        tracker.rebuild_weight_trend(cursor)
+    tracker.rebuild_daily_summary()
+    return counts
+
+# A stand-in for requests' Response that answers every FDC search with one food
+class StubResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, query):
+        self.query = query
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'foods': [{
+            'fdcId': 100000 + sum(map(ord, self.query)),
+            'description': self.query.title(),
+            'foodNutrients': [
+                {'nutrientId': 1008, 'value': 150.0},
+                {'nutrientId': 1003, 'value': 8.0},
+                {'nutrientId': 1005, 'value': 20.0},
+                {'nutrientId': 1004, 'value': 4.0},
+            ],
+        }]}
+
+# Function to answer console prompts: no date limits, and stop after the first page
+def scripted_input(prompt=''):
+    return 'q' if 'see more' in prompt else ''
+
+# Function to build the benchmark cases: name -> function called once per timed iteration
+def make_cases(tracker, counts, seed=42):
+    rng = np.random.default_rng(seed + 1)
+    with tracker.db_connection() as conn:
+        owners = conn.execute('SELECT id, user_id FROM recipes ORDER BY id').fetchall()
+    recipe_ids = [owners[index] for index in rng.integers(0, len(owners), 100_000).tolist()]
+    user_ids = rng.integers(1, counts['users'] + 1, 100_000).tolist()
+    position = {'recipe': 0, 'user': 0, 'weight': 0}
+
+    def next_value(values, key):
+        position[key] = (position[key] + 1) % len(values)
+        return values[position[key]]
+
+    def get_recipe_by_id():
+        recipe_id, user_id = next_value(recipe_ids, 'recipe')
+        return tracker.get_recipe_by_id(recipe_id, user_id)
+
+    def log_workout_to_database():
+        tracker.log_workout_to_database([('Squat', 30, 120.0), ('Bench Press', 30, 95.5), ('Rowing', 20, 80.0)], 295.5)
+
+    def recalculate_goal_difference():
+        with tracker.db_transaction(tracker.DEFAULT_USER_ID) as cursor:
+            tracker.recalculate_goal_difference(cursor, next_value(user_ids, 'user'))
+
+    # Every iteration starts with an empty ingredient cache, so each ingredient goes through the stubbed API
+    def create_recipe():
+        tracker.clear_ingredient_cache()
+        tracker.record_recipe('Benchmark bowl', RECIPE_INGREDIENTS)
+
+    weights = np.random.default_rng(seed + 2).uniform(55, 110, 10_000).tolist()
+
+    def bmr_tdee_scalar():
+        weight = next_value(weights, 'weight')
+        tracker.calculate_tdee(tracker.calculate_bmr(weight, 175.0, 35, 'male'), 'moderately active')
+
+    batch = make_rows(100_000, seed)
+
+    def bmr_tdee_batch_100k():
+        bmr = tracker.calculate_bmr_batch(batch['weights'], batch['heights'], batch['ages'], batch['genders'])
+        tracker.calculate_tdee_batch(bmr, batch['activity_levels'])
+
+    return {
+        'view_meals': tracker.view_meals,
+        'view_weight_history': tracker.view_weight_history,
+        'get_recipe_by_id': get_recipe_by_id,
+        'log_workout_to_database': log_workout_to_database,
+        'recalculate_goal_difference': recalculate_goal_difference,
+        'create_recipe_stubbed_api': create_recipe,
+        'bmr_tdee_scalar': bmr_tdee_scalar,
+        'bmr_tdee_batch_100k': bmr_tdee_batch_100k,
+    }
+
+# Function to time one case: `repeat` timed calls (after a few warm-up calls), then one call under tracemalloc
+def run_case(function, repeat, warmup=3):
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        function()
+        timings.append((time.perf_counter_ns() - start) / 1e6)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    p50, p90, p99 = np.percentile(timings, [50, 90, 99]).tolist()
+    return {
+        'iterations': repeat,
+        'mean_ms': statistics.fmean(timings),
+        'min_ms': min(timings),
+        'p50_ms': p50,
+        'p90_ms': p90,
+        'p99_ms': p99,
+        'max_ms': max(timings),
+        'peak_memory_kb': peak / 1024,
+    }
+
+# Function to compare results with a baseline; returns the cases whose p50 got slower than the tolerance allows
+def compare_with_baseline(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            print(f"{name:<30} (not in baseline)")
+            continue
+        change = result['p50_ms'] / previous['p50_ms'] - 1 if previous['p50_ms'] else 0.0
+        regressed = change > tolerance
+        print(f"{name:<30} p50 {previous['p50_ms']:10.3f} -> {result['p50_ms']:10.3f} ms ({change:+.0%})"
+              f"{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Fitness Tracker benchmark suite.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for the number of seeded rows.')
+    parser.add_argument('--repeat', type=int, default=200, help='Timed iterations per case.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cases', nargs='*', help='Only run these cases.')
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--save-baseline', help='Write the results to this JSON file as the new baseline.')
+    parser.add_argument('--baseline', help='Compare with this baseline JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p50 slowdown against the baseline.')
+    args = parser.parse_args()
+
+    tracker = load_tracker()
+    with tempfile.TemporaryDirectory() as directory:
+        tracker.close_db_pool()
+        tracker.DB_PATH = os.path.join(directory, 'bench.db')
+        tracker.DB_SHARD_PATHS = []
+        tracker.http_get = lambda url, params=None, timeout=None: StubResponse(params['query'])
+        tracker.UPSTREAM_HOST_LIMITS = {'api.nal.usda.gov': (1e9, 1e9, 3, 60)}  # the stub has no rate limit
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker.setup_database()
+            start = time.perf_counter()
+            counts = seed_database(tracker, args.scale, args.seed)
+            seed_seconds = time.perf_counter() - start
+        print(f"Seeded {', '.join(f'{value} {key}' for key, value in counts.items())} in {seed_seconds:.1f} s")
+
+        cases = make_cases(tracker, counts, args.seed)
+        results = {}
+        original_input = builtins.input
+        builtins.input = scripted_input
+        try:
+            for name, function in cases.items():
+                if args.cases and name not in args.cases:
+                    continue
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results[name] = run_case(function, args.repeat)
+                result = results[name]
+                print(f"{name:<30} p50 {result['p50_ms']:10.3f}  p90 {result['p90_ms']:10.3f}  "
+                      f"p99 {result['p99_ms']:10.3f} ms  peak {result['peak_memory_kb']:9.1f} KB")
+        finally:
+            builtins.input = original_input
+            tracker.close_db_pool()
+
+    report = {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'rows': counts,
+        },
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
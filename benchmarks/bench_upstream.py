@@ -0,0 +1,112 @@
+# Benchmark: the shared upstream client against a local mock of the USDA search API.
+# Shows request coalescing, per-host rate limiting and the circuit breaker, with real HTTP over keep-alive.
+# Usage: python benchmarks/bench_upstream.py [--callers 50]
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_calculators import load_tracker
+
+MOCK_LATENCY = 0.05  # seconds the mock takes to answer
+
+# The mock upstream: answers every search after MOCK_LATENCY, or fails the way `mode` says
+class MockUpstream(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mode = 'ok'  # 'ok', '503' or '429'
+    hits = []  # (time, query) of every request that reached the mock
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get('query', [''])[0]
+        MockUpstream.hits.append((time.monotonic(), query))
+        time.sleep(MOCK_LATENCY)
+        if self.mode == 'ok':
+            status, body = 200, json.dumps({'foods': [{'fdcId': 1, 'description': query, 'foodNutrients': []}]})
+        else:
+            status, body = int(self.mode), json.dumps({'error': 'unavailable'})
+        body = body.encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Function to call the client from many threads at once; returns (results, seconds)
+def call_concurrently(client, url, queries, callers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(callers) as executor:
+        results = list(executor.map(lambda query: client.get_sync(url, {'query': query}, 5), queries))
+    return results, time.perf_counter() - start
+
+def reasons(results):
+    counts = {}
+    for result in results:
+        key = 'ok' if result['ok'] else result['reason']
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Upstream client benchmark against a local mock of the USDA API.')
+    parser.add_argument('--callers', type=int, default=50, help='Threads calling the client at once.')
+    callers = parser.parse_args().callers
+    tracker = load_tracker()
+    from fitness_tracker.upstream import UpstreamClient
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/fdc/v1/foods/search"
+
+    # 1. Coalescing: 10 distinct queries asked 20 times each, all at once
+    client = UpstreamClient(tracker.http_get, {'127.0.0.1': (1000.0, 1000, 3, 60)})
+    queries = [f"food {n % 10}" for n in range(200)]
+    results, seconds = call_concurrently(client, url, queries, callers)
+    print(f"coalescing: {len(queries)} calls, {len(MockUpstream.hits)} reached the upstream, "
+          f"{seconds * 1000:.0f} ms, {reasons(results)}")
+    client.close()
+
+    # 2. Rate limiting: 20 requests a second with a burst of 5, 100 distinct queries
+    MockUpstream.hits = []
+    client = UpstreamClient(tracker.http_get, {'127.0.0.1': (20.0, 5, 3, 60)}, max_wait=2.0)
+    results, seconds = call_concurrently(client, url, [f"food {n}" for n in range(100)], callers)
+    times = sorted(hit_time for hit_time, _ in MockUpstream.hits)
+    busiest = max(sum(1 for t in times if start <= t < start + 1) for start in times) if times else 0
+    print(f"rate limit: {len(times)} reached the upstream, at most {busiest} in any second, "
+          f"{seconds * 1000:.0f} ms, {reasons(results)}")
+    client.close()
+
+    # 3. Circuit breaker: the upstream fails with 503; after 3 failures calls fail at once
+    MockUpstream.hits, MockUpstream.mode = [], '503'
+    client = UpstreamClient(tracker.http_get, {'127.0.0.1': (1000.0, 1000, 3, 60)})
+    results = []
+    for n in range(20):
+        start = time.perf_counter()
+        result = client.get_sync(url, {'query': f"food {n}"}, 5)
+        results.append(result)
+        if n in (0, 3, 19):
+            print(f"circuit: call {n + 1}: {result['reason']} in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"circuit: {len(MockUpstream.hits)} of 20 calls reached the upstream, {reasons(results)}, "
+          f"state {client.host_stats()['127.0.0.1']['circuit']}")
+    client.close()
+
+    # 4. A 429 stops the host for its Retry-After time
+    MockUpstream.hits, MockUpstream.mode = [], '429'
+    client = UpstreamClient(tracker.http_get, {'127.0.0.1': (1000.0, 1000, 5, 60)}, max_wait=0.5)
+    first = client.get_sync(url, {'query': 'food'}, 5)
+    second = client.get_sync(url, {'query': 'other food'}, 5)
+    print(f"429: first {first['reason']} (HTTP {first['status']}), next call {second['reason']} "
+          f"without reaching the upstream: {len(MockUpstream.hits) == 1}")
+    client.close()
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
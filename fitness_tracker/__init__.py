@@ -0,0 +1,7 @@
+# The Fitness Tracker package.
+#   fitness_tracker.tracker    database, lookups, calculators, services and the interactive menu
+#   fitness_tracker.server     the local HTTP/JSON API (imported only by the serve command)
+#   fitness_tracker.analytics  NumPy trend analysis and column files (imported only by its commands)
+#   fitness_tracker.upstream   the shared rate-limited client for the remote APIs (imported on the first remote lookup)
+#   fitness_tracker.cli        the command line entry point (also `python -m fitness_tracker`)
+# Settings such as DB_PATH are module globals of fitness_tracker.tracker; set them there.
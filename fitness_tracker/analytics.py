@@ -0,0 +1,294 @@
+import math
+import os
+
+import numpy as np
+
+from . import tracker
+
+# Trend analytics over the daily summary, computed on whole NumPy arrays.
+# Data comes in two sets of flat columns (dicts of equally long arrays):
+#   days:  one row per user and day, sorted by user then day: user_id, day (datetime64[D]) and DAY_COLUMNS,
+#          with weight NaN on days without a weigh-in
+#   users: one row per user: user_id and USER_COLUMNS (the latest goal weight and the profile; NaN/'' if unset)
+# load_columns() reads them from SQLite; export_columns() saves them as .npy files that open_columns()
+# memory-maps, so repeated analysis skips SQLite. Turning rows into Python objects is the slow part: a decade
+# for 1000 users (3.65 million days) takes seconds to load from SQLite and milliseconds to open from the files.
+# For the analysis each day column is laid out on a users x days grid: its values (0 on days a user has no row)
+# and a mask of the days that have one. Averages are sums over counts, so they come out NaN where nothing was logged.
+DAY_COLUMNS = ('calories', 'protein', 'carbs', 'fats', 'meal_count', 'calories_burned', 'workout_count', 'weight')
+USER_COLUMNS = ('goal_weight', 'gender', 'height', 'age', 'activity_level')
+ANALYTICS_WINDOW = 28  # days used for rolling averages and projections
+
+# Function to read the daily summary and user goals/profiles into columns, for every user or the given ones,
+# and for every day or the days between start and end (inclusive)
+def load_columns(user_ids=None, start=None, end=None):
+    if user_ids is None:
+        paths = {path: None for path in tracker.all_db_paths()}
+    else:
+        paths = {}
+        for user_id in user_ids:
+            paths.setdefault(tracker.db_path_for_user(user_id), []).append(int(user_id))
+    day_rows, user_rows = [], []
+    for path, path_user_ids in paths.items():
+        user_filter = f"user_id IN ({','.join('?' * len(path_user_ids))}) AND" if path_user_ids else ''
+        params = path_user_ids or []
+        with tracker.db_connection(path=path) as conn:
+            day_rows += conn.execute(f'''
+                SELECT user_id, day, calories, protein, carbs, fats, meal_count, calories_burned, workout_count,
+                       latest_weight
+                FROM daily_summary WHERE {user_filter} day >= ? AND day <= ?
+                ORDER BY user_id, day
+            ''', (*params, start or '0000-01-01', end or '9999-12-31')).fetchall()
+            user_rows += conn.execute(f'''
+                SELECT p.user_id, g.goal_weight, p.gender, p.height, p.age, p.activity_level
+                FROM user_profiles p
+                LEFT JOIN goal_information g ON g.id = (SELECT MAX(id) FROM goal_information WHERE user_id = p.user_id)
+                WHERE {user_filter.replace('user_id', 'p.user_id')} 1
+                ORDER BY p.user_id
+            ''', params).fetchall()
+
+    day_values = list(zip(*day_rows)) or [()] * (len(DAY_COLUMNS) + 2)
+    days = {
+        'user_id': np.array(day_values[0], dtype=np.int64),
+        'day': np.array(day_values[1], dtype='datetime64[D]'),
+    }
+    for name, values in zip(DAY_COLUMNS, day_values[2:]):
+        days[name] = np.array(values, dtype=np.float64)  # None (no weigh-in) becomes NaN
+    user_values = list(zip(*user_rows)) or [()] * (len(USER_COLUMNS) + 1)
+    users = {
+        'user_id': np.array(user_values[0], dtype=np.int64),
+        'goal_weight': np.array(user_values[1], dtype=np.float64),
+        'gender': np.array([(value or '').lower() for value in user_values[2]], dtype=str),
+        'height': np.array(user_values[3], dtype=np.float64),
+        'age': np.array(user_values[4], dtype=np.float64),
+        'activity_level': np.array([(value or '').lower() for value in user_values[5]], dtype=str),
+    }
+    if len(paths) > 1:  # rows from several database files: restore the user/day order
+        order = np.lexsort((days['day'], days['user_id']))
+        days = {name: values[order] for name, values in days.items()}
+        order = np.argsort(users['user_id'], kind='stable')
+        users = {name: values[order] for name, values in users.items()}
+    return days, users
+
+# Function to save day and user columns as <directory>/days/<name>.npy and <directory>/users/<name>.npy.
+# Each file is written next to its final name and then renamed over it.
+def save_columns(directory, days, users):
+    for group, columns in (('days', days), ('users', users)):
+        os.makedirs(os.path.join(directory, group), exist_ok=True)
+        for name, values in columns.items():
+            path = os.path.join(directory, group, name + '.npy')
+            np.save(path + '.tmp.npy', values)
+            os.replace(path + '.tmp.npy', path)
+
+# Function to save the daily summary and user goals/profiles (see load_columns) for open_columns; returns the day count
+def export_columns(directory, user_ids=None, start=None, end=None):
+    days, users = load_columns(user_ids, start, end)
+    save_columns(directory, days, users)
+    return len(days['user_id'])
+
+# Function to open columns saved by save_columns/export_columns without reading them into memory
+def open_columns(directory):
+    columns = []
+    for group, names in (('days', ('user_id', 'day') + DAY_COLUMNS), ('users', ('user_id',) + USER_COLUMNS)):
+        columns.append({name: np.load(os.path.join(directory, group, name + '.npy'), mmap_mode='r') for name in names})
+    return tuple(columns)
+
+# Function to lay the day columns out on a users x days grid. The columns must be sorted by user
+# (load_columns and open_columns return them that way). Returns (user_ids, first_day, values, present):
+# values[name] has 0 on the days a user has no row or a NaN value, present[name] marks the others.
+def daily_grid(days, names=DAY_COLUMNS):
+    user_column = np.asarray(days['user_id'])
+    if not len(user_column):
+        return user_column, None, {name: np.zeros((0, 0)) for name in names}, {name: np.zeros((0, 0), bool) for name in names}
+    starts = np.flatnonzero(np.concatenate(([True], user_column[1:] != user_column[:-1])))
+    day_numbers = np.asarray(days['day']).astype(np.int64)  # days since 1970-01-01
+    first, width = int(day_numbers.min()), int(day_numbers.max() - day_numbers.min()) + 1
+    # Position of every row in the flattened grid
+    cells = np.repeat(np.arange(len(starts)) * width, np.diff(np.append(starts, len(user_column)))) + day_numbers - first
+    values, present = {}, {}
+    for name in names:
+        column = np.asarray(days[name])
+        logged = ~np.isnan(column)
+        values[name] = np.zeros(len(starts) * width)
+        values[name][cells] = column if logged.all() else np.where(logged, column, 0.0)
+        present[name] = np.zeros(len(starts) * width, bool)
+        present[name][cells] = logged
+        values[name], present[name] = values[name].reshape(len(starts), width), present[name].reshape(len(starts), width)
+    return user_column[starts], np.datetime64(first, 'D'), values, present
+
+# Function to match the profile rows to the grid rows; returns {name: array} with one entry per grid row
+def _align_users(user_ids, users):
+    positions = np.minimum(np.searchsorted(users['user_id'], user_ids), len(users['user_id']) - 1)
+    found = users['user_id'][positions] == user_ids if len(users['user_id']) else np.zeros(len(user_ids), bool)
+    aligned = {}
+    for name in USER_COLUMNS:
+        missing = '' if users[name].dtype.kind == 'U' else np.nan
+        aligned[name] = np.where(found, users[name][positions], missing) if len(users['user_id']) else \
+            np.full(len(user_ids), missing)
+    return aligned
+
+# Function to average each row over a sliding window of days, counting only the present days.
+# Day d covers days d - window + 1 to d; NaN where the window has none.
+def rolling_mean(values, present, window=ANALYTICS_WINDOW):
+    sums = np.cumsum(values, axis=1)
+    counts = np.cumsum(present, axis=1, dtype=np.int32)
+    means = np.empty(values.shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.divide(sums[:, :window], counts[:, :window], out=means[:, :window])
+        np.divide(sums[:, window:] - sums[:, :-window], counts[:, window:] - counts[:, :-window], out=means[:, window:])
+    return means
+
+# Function to average each row over periods of `period` days, counting only the present days. Periods are
+# counted from Monday 1970-01-05, so period=7 gives calendar weeks. Returns (first day of each period, averages).
+def resample(values, present, first_day, period=7):
+    lead = int((first_day - np.datetime64('1970-01-05')).astype(np.int64)) % period
+    edges = np.arange(-(-(lead + values.shape[1]) // period)) * period - lead
+    edges[0] = 0
+    sums = np.add.reduceat(values, edges, axis=1)
+    counts = np.add.reduceat(present, edges, axis=1, dtype=np.int64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return first_day - lead + np.arange(len(edges)) * period, sums / counts
+
+# Function to compute each row's trend weight (an exponential moving average of its weigh-ins) on every day.
+# Matches the goal engine: a weigh-in t days after the previous one keeps (1 - GOAL_TREND_ALPHA) ** t of the
+# old trend. Days before a row's first weigh-in are NaN.
+# Unrolled, the trend at weigh-in i is sum_j decay ** (t_i - t_j) * c_j, where c_j is the share weigh-in j
+# brought in, so one cumulative sum of c_j * decay ** -t_j gives it for every day. Days are taken in blocks
+# short enough for decay ** -t to stay within floating point range.
+def trend_weights(weights, weighed, alpha=None):
+    decay = 1 - (tracker.GOAL_TREND_ALPHA if alpha is None else alpha)
+    rows, total_days = weights.shape
+    block = min(total_days, max(1, int(50 / -math.log10(decay)))) if 0 < decay < 1 else 1
+    # decay ** gap for every possible gap; an index past the end stands for "no earlier weigh-in" and keeps nothing
+    kept_by_gap = np.append(decay ** np.arange(total_days + 1, dtype=np.float64), 0.0)
+    scale_by_day = decay ** -np.arange(block, dtype=np.float64)
+    no_weigh_in = -2 * total_days - 2
+    trend = np.empty(weights.shape)
+    current = np.zeros(rows)  # trend at the last weigh-in before the block
+    last_day = np.full(rows, no_weigh_in)  # day of that weigh-in
+    for start in range(0, total_days, block):
+        stop = min(start + block, total_days)
+        days = np.arange(start, stop)
+        values, scale = weights[:, start:stop], scale_by_day[:stop - start]
+        # Day of the last weigh-in up to each day, and before each day
+        seen = weighed[:, start:stop] * (days - no_weigh_in) + no_weigh_in
+        np.maximum.accumulate(seen, axis=1, out=seen)
+        np.maximum(seen, last_day[:, None], out=seen)
+        gaps = np.concatenate((last_day[:, None], seen[:, :-1]), axis=1)
+        np.subtract(days, gaps, out=gaps)
+        np.minimum(gaps, total_days + 1, out=gaps)
+        shares = (1 - kept_by_gap[gaps]) * values  # 0 on days without a weigh-in
+        shares *= scale
+        totals = np.cumsum(shares, axis=1)
+        # The trend carried in from before the block counts as a share at its start. Before the block's first
+        # weigh-in the trend is still that carried trend (NaN if there was none).
+        carried = np.maximum(kept_by_gap[np.minimum(start - last_day, total_days + 1)], np.finfo(float).tiny)
+        totals += (current * carried)[:, None]
+        # Between weigh-ins the totals don't change, so scaling by the last weigh-in's day gives the trend on every day
+        offsets = seen - start
+        trend[:, start:stop] = totals / np.where(offsets >= 0, scale_by_day[np.maximum(offsets, 0)],
+                                                 np.where(last_day >= 0, carried, np.nan)[:, None])
+        current, last_day = np.nan_to_num(trend[:, stop - 1]), seen[:, -1]
+    return trend
+# Function to estimate each row's daily energy balance: calories eaten minus calories burned in workouts
+# minus TDEE at the trend weight. NaN on days without meals or for users without a full profile.
+# TDEE is linear in weight, so it is worked out per user at 0 and 1 kg and scaled, not per day.
+def energy_balance(eaten, ate, burned, trend, user_ids, users):
+    profile = _align_users(user_ids, users)
+    valid = (np.isin(profile['gender'], ('male', 'female'))
+             & np.isin(profile['activity_level'], list(tracker.ACTIVITY_FACTORS))
+             & ~np.isnan(profile['height']) & ~np.isnan(profile['age']))
+    base, per_kg = np.full(len(user_ids), np.nan), np.full(len(user_ids), np.nan)
+    if valid.any():
+        at_weight = [tracker.calculate_tdee_batch(
+            tracker.calculate_bmr_batch(np.full(valid.sum(), weight), profile['height'][valid],
+                                        profile['age'][valid], profile['gender'][valid]),
+            profile['activity_level'][valid]) for weight in (0.0, 1.0)]
+        base[valid], per_kg[valid] = at_weight[0], at_weight[1] - at_weight[0]
+    balance = trend * -per_kg[:, None]
+    balance -= base[:, None]
+    balance += eaten
+    balance -= burned
+    balance[~ate] = np.nan
+    return balance
+
+# Function to find each row's last present day; returns (days, whether the row has one)
+def _last_present(present):
+    return present.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1), present.any(axis=1)
+
+# Function to project when each row reaches its goal weight, from the `window` days up to its last weigh-in.
+# linear: a least-squares line through those weigh-ins; ema: the change in trend weight over the window.
+# Returns {'last_weigh_in', 'trend_weight', 'linear_kg_per_week', 'ema_kg_per_week', 'linear_goal_date',
+# 'ema_goal_date'}; a goal date is NaT when the weight isn't moving towards the goal.
+def project_goal_dates(weights, weighed, trend, goal_weights, first_day, window=ANALYTICS_WINDOW):
+    last, has_weight = _last_present(weighed)
+    # Only the window before each row's last weigh-in matters: gather it, with x in days back from that weigh-in
+    x = np.arange(1 - window, 1)
+    columns = np.maximum(last[:, None] + x, 0)
+    present = np.take_along_axis(weighed, columns, axis=1) & (last[:, None] + x >= 0)
+    y = np.take_along_axis(weights, columns, axis=1) * present
+    x = x * present
+    n = present.sum(axis=1)
+    sum_x, sum_y = x.sum(axis=1), y.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (n * (x * y).sum(axis=1) - sum_x * sum_y) / (n * (x * x).sum(axis=1) - sum_x ** 2)
+        fitted = (sum_y - slope * sum_x) / n  # the line's value at the last weigh-in
+    slope[n < 2] = np.nan
+
+    rows = np.arange(len(last))
+    trend_now = np.where(has_weight, trend[rows, last], np.nan)
+    ema_slope = np.where(last >= window, trend_now - trend[rows, np.maximum(last - window, 0)], np.nan) / window
+    last_weigh_in = np.where(has_weight, first_day + last, np.datetime64('NaT'))
+    result = {
+        'last_weigh_in': last_weigh_in,
+        'trend_weight': trend_now,
+        'linear_kg_per_week': slope * 7,
+        'ema_kg_per_week': ema_slope * 7,
+    }
+    for name, weight, rate in (('linear', fitted, slope), ('ema', trend_now, ema_slope)):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            days_left = np.ceil((goal_weights - weight) / rate)
+        days_left[np.abs(goal_weights - weight) < 0.05] = 0  # already there
+        reachable = np.isfinite(days_left) & (days_left >= 0)
+        goal_dates = np.full(len(rows), np.datetime64('NaT'), dtype='datetime64[D]')
+        goal_dates[reachable] = last_weigh_in[reachable] + days_left[reachable].astype(np.int64)
+        result[f'{name}_goal_date'] = goal_dates
+    return result
+
+# Function to run the trend analysis over day and user columns (from load_columns or open_columns).
+# Returns None without data, else a dict with one entry per user in 'user_id' and:
+#   'first_day', 'daily': per-day grids from first_day of the trend weight and the rolling energy balance
+#   'weeks', 'weekly': the Monday of each week, and weekly averages of weight, calories, calories burned
+#                      and energy balance
+#   'goal_weight', 'energy_balance' (the rolling energy balance on the user's last day with meals)
+#   and the goal projections from project_goal_dates
+def analyze(days, users, window=ANALYTICS_WINDOW):
+    # A day without meals wasn't logged, it isn't a fast
+    eaten = np.where(np.asarray(days['meal_count']) > 0, days['calories'], np.nan)
+    user_ids, first_day, values, present = daily_grid({**days, 'calories': eaten}, ('calories', 'calories_burned', 'weight'))
+    if first_day is None:
+        return None
+    ate = present['calories']
+    trend = trend_weights(values['weight'], present['weight'])
+    balance = energy_balance(values['calories'], ate, values['calories_burned'], trend, user_ids, users)
+    logged = ~np.isnan(balance)
+    balance_values = np.where(logged, balance, 0.0)
+    rolling_balance = rolling_mean(balance_values, logged, window)
+    weekly = {}
+    for name, column, column_present in (
+            ('weight', values['weight'], present['weight']), ('calories', values['calories'], ate),
+            ('calories_burned', values['calories_burned'], present['calories_burned']),
+            ('energy_balance', balance_values, logged)):
+        weeks, weekly[name] = resample(column, column_present, first_day)
+    last_logged, has_logged = _last_present(logged)
+    goal_weights = _align_users(user_ids, users)['goal_weight']
+    return {
+        'user_id': user_ids,
+        'first_day': first_day,
+        'daily': {'trend_weight': trend, 'energy_balance': rolling_balance},
+        'weeks': weeks,
+        'weekly': weekly,
+        'goal_weight': goal_weights,
+        'energy_balance': np.where(has_logged, rolling_balance[np.arange(len(user_ids)), last_logged], np.nan),
+        **project_goal_dates(values['weight'], present['weight'], trend, goal_weights, first_day, window),
+    }
@@ -0,0 +1,193 @@
+# Command line entry point: no arguments opens the interactive menu, otherwise a maintenance command runs.
+# Only the modules a command needs are imported (the HTTP server, NumPy and requests load on first use).
+import argparse
+import csv
+import sys
+import zipfile
+
+from . import tracker
+
+# Function to format a number for the trends report, or "n/a" if it is missing
+def _number(value, unit, spec='.1f'):
+    return 'n/a' if tracker.np.isnan(value) else f"{value:{spec}} {unit}"
+
+# Function to format a projected date for the trends report
+def _date(value):
+    return 'not on track' if tracker.np.isnat(value) else str(value)
+
+# Function to run a non-interactive command given on the command line
+def run_command(argv):
+    parser = argparse.ArgumentParser(prog='Fitness Tracker.py', description='Fitness Tracker maintenance commands.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild-summary', help='Rebuild the daily_summary table from meals, workouts and weights.')
+    commands.add_parser('verify-summary', help='Check the daily_summary table against meals, workouts and weights.')
+    commands.add_parser('recompute-recipes', help='Recompute recipe totals from the stored nutrient vectors.')
+    load_fdc_command = commands.add_parser('load-fdc', help='Load a downloaded USDA FoodData Central dataset (CSV or JSON).')
+    load_fdc_command.add_argument('path', help='Folder or .zip with food.csv and food_nutrient.csv, or a .json/.zip JSON download.')
+    load_fdc_command.add_argument('--batch-size', type=int, default=tracker.FDC_LOAD_BATCH_SIZE)
+    for name, help_text in (('import', 'Import rows from a CSV or JSONL file.'), ('export', 'Export rows to a CSV or JSONL file.')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('table', choices=sorted(tracker.BULK_FIELDS))
+        command.add_argument('path')
+        command.add_argument('--format', choices=['csv', 'jsonl'])
+        command.add_argument('--user', type=int, default=tracker.DEFAULT_USER_ID, help='User whose rows are imported/exported.')
+    commands.choices['import'].add_argument('--batch-size', type=int, default=tracker.BULK_BATCH_SIZE)
+    commands.choices['import'].add_argument('--rejects', help='Write every rejected row (line number and reason) to this CSV file.')
+    import_plan_command = commands.add_parser(
+        'import-plan', help='Log every session of a workout plan file (CSV or JSONL), working out the calories burned.')
+    import_plan_command.add_argument('path')
+    import_plan_command.add_argument('--format', choices=['csv', 'jsonl'])
+    import_plan_command.add_argument('--weight', type=float, help='Body weight in kg for sessions that have no weight_kg.')
+    import_plan_command.add_argument('--user', type=int, default=tracker.DEFAULT_USER_ID, help='User whose workouts are logged.')
+    import_plan_command.add_argument('--batch-size', type=int, default=tracker.PLAN_BATCH_SIZE)
+    archive_command = commands.add_parser(
+        'archive', help='Move meals and workouts older than the retention period into the compressed archive.')
+    archive_command.add_argument('--days', type=int, default=tracker.RETENTION_DAYS, help='Keep this many days live.')
+    archive_command.add_argument('--user', type=int, help='Only this user; default: everyone.')
+    restore_archive_command = commands.add_parser('restore-archive', help="Move a user's archived days back into the live tables.")
+    restore_archive_command.add_argument('--user', type=int, default=tracker.DEFAULT_USER_ID)
+    restore_archive_command.add_argument('--start', help='First day (YYYY-MM-DD).')
+    restore_archive_command.add_argument('--end', help='Last day (YYYY-MM-DD).')
+    commands.add_parser('vacuum', help='Give the free space in the database files back to the filesystem.')
+    export_columns_command = commands.add_parser(
+        'export-columns', help='Save the daily summary and goals as NumPy column files for the trends command.')
+    export_columns_command.add_argument('directory')
+    trends_command = commands.add_parser(
+        'trends', help='Show trend weights, energy balance and projected goal dates.')
+    trends_command.add_argument('--columns', metavar='DIRECTORY', help='Read columns saved by export-columns instead of the database.')
+    trends_command.add_argument('--window', type=int, help='Days used for the energy balance and projections (default 28).')
+    for command in (export_columns_command, trends_command):
+        command.add_argument('--user', type=int, action='append', help='Only this user (repeat for more); default: everyone.')
+    export_columns_command.add_argument('--start', help='First day (YYYY-MM-DD).')
+    export_columns_command.add_argument('--end', help='Last day (YYYY-MM-DD).')
+    serve_command = commands.add_parser('serve', help='Serve the tracker as a local HTTP/JSON API.')
+    serve_command.add_argument('--host', default='127.0.0.1')
+    serve_command.add_argument('--port', type=int, default=8000)
+    serve_command.add_argument('--write-behind', action='store_true',
+                               help='Queue meal, workout and weight inserts and commit them in batches.')
+    serve_command.add_argument('--vacuum', action='store_true',
+                               help=f"Free up to {tracker.VACUUM_STEP_PAGES} unused pages per database file every minute.")
+    serve_command.add_argument('--metrics', action='store_true', help='Time menu actions, lookups, HTTP calls and SQL.')
+    serve_command.add_argument('--metrics-dump', metavar='PATH', help='Also append a JSON metrics snapshot to PATH every minute.')
+    args = parser.parse_args(argv)
+
+    tracker.setup_database()
+    if args.command == 'rebuild-summary':
+        days = tracker.rebuild_daily_summary()
+        print(f"Daily summary rebuilt: {days} days.")
+    elif args.command == 'verify-summary':
+        mismatched = tracker.verify_daily_summary()
+        if mismatched:
+            print(f"Daily summary differs from the raw data on {len(mismatched)} days:")
+            for user_id, day in mismatched:
+                print(f"user {user_id}: {day}")
+            return 1
+        print("Daily summary matches the raw data.")
+    elif args.command == 'recompute-recipes':
+        print(f"Recomputed {tracker.recompute_recipe_nutrition()} recipes.")
+    elif args.command == 'load-fdc':
+        try:
+            loaded = tracker.load_fdc_dataset(args.path, args.batch_size)
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print("Error loading FDC data:", e)
+            return 1
+        print(f"Loaded {loaded} foods. Recomputed {tracker.recompute_recipe_nutrition()} recipes with the new data.")
+    elif args.command == 'import':
+        try:
+            report = tracker.bulk_import(args.table, args.path, args.format, args.batch_size, user_id=args.user)
+        except (OSError, ValueError) as e:
+            print("Error importing:", e)
+            return 1
+        print(f"Import finished: {report['imported']} imported, {report['duplicates']} duplicates skipped, "
+              f"{report['rejected']} rejected.")
+        for line_number, reason in report['rejects'][:tracker.BULK_MAX_REPORTED_REJECTS]:
+            print(f"Line {line_number}: {reason}")
+        if report['rejected'] > tracker.BULK_MAX_REPORTED_REJECTS:
+            print(f"... and {report['rejected'] - tracker.BULK_MAX_REPORTED_REJECTS} more rejected rows.")
+        if args.rejects:
+            with open(args.rejects, 'w', newline='', encoding='utf-8') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['line', 'reason'])
+                writer.writerows(report['rejects'])
+    elif args.command == 'export':
+        try:
+            written = tracker.bulk_export(args.table, args.path, args.format, args.user)
+        except (OSError, ValueError) as e:
+            print("Error exporting:", e)
+            return 1
+        print(f"Exported {written} {args.table} to {args.path}.")
+    elif args.command == 'import-plan':
+        try:
+            report = tracker.import_workout_plan(args.path, args.format, args.weight, args.batch_size, user_id=args.user)
+        except (OSError, ValueError) as e:
+            print("Error importing workout plan:", e)
+            return 1
+        print(f"Workout plan imported: {report['imported']} workouts logged, {report['duplicates']} duplicates skipped, "
+              f"{report['rejected']} rejected.")
+        for line_number, reason in report['rejects'][:tracker.BULK_MAX_REPORTED_REJECTS]:
+            print(f"Line {line_number}: {reason}")
+        if report['rejected'] > tracker.BULK_MAX_REPORTED_REJECTS:
+            print(f"... and {report['rejected'] - tracker.BULK_MAX_REPORTED_REJECTS} more rejected sessions.")
+        for name, count in sorted(report['skipped_exercises'].items()):
+            print(f"Exercise not found, left out of {count} sessions: {name}")
+    elif args.command in ('archive', 'vacuum'):
+        if args.command == 'archive':
+            report = tracker.archive_old_rows(args.days, args.user)
+            print(f"Archived {report['meals']} meals and {report['workouts']} workouts "
+                  f"({report['exercises']} exercises) from {report['days']} days.")
+        for path, (before, after) in tracker.vacuum_databases().items():
+            print(f"{path}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    elif args.command == 'restore-archive':
+        try:
+            days = tracker.restore_archived_days(args.start, args.end, args.user)
+        except ValueError as e:
+            print("Error restoring archived days:", e)
+            return 1
+        print(f"Restored {days} archived days.")
+    elif args.command == 'export-columns':
+        from . import analytics
+        try:
+            written = analytics.export_columns(args.directory, args.user, args.start, args.end)
+        except (OSError, ValueError) as e:
+            print("Error exporting columns:", e)
+            return 1
+        print(f"Exported {written} days to {args.directory}.")
+    elif args.command == 'trends':
+        from . import analytics
+        try:
+            days, users = analytics.open_columns(args.columns) if args.columns else analytics.load_columns(args.user)
+        except (OSError, ValueError) as e:
+            print("Error loading columns:", e)
+            return 1
+        if args.columns and args.user:
+            selected = tracker.np.isin(days['user_id'], args.user)
+            days = {name: values[selected] for name, values in days.items()}
+        report = analytics.analyze(days, users, args.window or analytics.ANALYTICS_WINDOW)
+        if report is None:
+            print("No data to analyze.")
+            return 0
+        for row, user_id in enumerate(report['user_id']):
+            print(f"User {user_id}: trend weight {_number(report['trend_weight'][row], 'kg')} "
+                  f"({_number(report['linear_kg_per_week'][row], 'kg/week', '+.2f')} linear, "
+                  f"{_number(report['ema_kg_per_week'][row], 'kg/week', '+.2f')} EMA), "
+                  f"energy balance {_number(report['energy_balance'][row], 'kcal/day', '+.0f')}")
+            if not tracker.np.isnan(report['goal_weight'][row]):
+                print(f"  goal {_number(report['goal_weight'][row], 'kg')}: "
+                      f"{_date(report['linear_goal_date'][row])} (linear), {_date(report['ema_goal_date'][row])} (EMA)")
+    elif args.command == 'serve':
+        from .server import serve
+        serve(args.host, args.port, args.write_behind, args.metrics, args.metrics_dump, args.vacuum)
+    return 0
+
+# Function to run the program: the menu, or the command given in argv
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return run_command(argv)
+    tracker.setup_database()  # Set up the database
+    metrics_dump_path = tracker.config_setting('METRICS_DUMP_PATH')  # works without a config.py
+    if metrics_dump_path:  # profile the interactive session too
+        tracker.enable_metrics()
+        tracker.start_metrics_dump(metrics_dump_path)
+    tracker.main_menu()  # Display the main menu
+    return 0
@@ -0,0 +1,148 @@
+import json
+import sqlite3
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import tracker
+
+# Local HTTP/JSON server over the service layer. Each connection is handled on its own thread
+# (keep-alive is supported) and all threads share the SQLite connection pool.
+# Requests act for the user named in the X-User-Id header (DEFAULT_USER_ID when it's missing).
+#   GET  /meals?start=&end=&after=&limit=      POST /meals     {"recipe_id"} or {"name", "calories", ...}
+#   GET  /weights?start=&end=&after=&limit=    POST /weights   {"weight"}
+#   GET  /recipes?after=&limit=                POST /recipes   {"name", "ingredients": [...]}
+#   GET  /recipes/search?q=&min_protein=&max_calories=&after=&limit=   (min_/max_ for calories, protein, carbs, fats)
+#   GET  /recipes/<id>                         POST /workouts  {"weight_kg", "exercises": [{"name", "sets", "reps"}]}
+#   GET  /summary?start=&end=                  POST /goal      {"current_weight", "goal_weight", ...} (saved)
+#   GET  /profile                              POST /profile   {"gender", "height", "age", "activity_level"}
+#   GET  /health                               GET  /metrics   (Prometheus text; filled in with serve --metrics)
+# With serve --write-behind, POST /meals, /weights and /workouts answer 202 with "queued": true and no id yet.
+class TrackerHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+class TrackerRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FitnessTracker/1.0'
+    # Headers and body go out in separate writes; with Nagle's algorithm on, the body waits for the client's
+    # delayed ACK of the headers (about 40 ms) on every keep-alive request
+    disable_nagle_algorithm = True
+
+    GET_ROUTES = {
+        '/meals': lambda query, user_id: tracker.list_meals(query.get('start'), query.get('end'), query.get('after'),
+                                                            query.get('limit', tracker.DEFAULT_PAGE_SIZE), user_id),
+        '/weights': lambda query, user_id: tracker.list_weights(query.get('start'), query.get('end'), query.get('after'),
+                                                                query.get('limit', tracker.DEFAULT_PAGE_SIZE), user_id),
+        '/recipes': lambda query, user_id: tracker.list_recipes(query.get('after'),
+                                                                query.get('limit', tracker.DEFAULT_PAGE_SIZE), user_id),
+        '/recipes/search': lambda query, user_id: tracker.search_recipes(
+            query.get('q', ''), query.get('after'), query.get('limit', tracker.DEFAULT_PAGE_SIZE), user_id,
+            **{key: value for key, value in query.items() if key.startswith(('min_', 'max_'))}),
+        '/summary': lambda query, user_id: tracker.list_daily_summary(query.get('start'), query.get('end'), user_id),
+        '/profile': lambda query, user_id: tracker.get_profile(user_id),
+        '/health': lambda query, user_id: {'status': 'ok'},
+    }
+    # path -> (service, success status)
+    POST_ROUTES = {
+        '/meals': (lambda body, user_id: tracker.record_meal(**body, user_id=user_id), 201),
+        '/weights': (lambda body, user_id: tracker.record_weight(**body, user_id=user_id), 201),
+        '/recipes': (lambda body, user_id: tracker.record_recipe(**body, user_id=user_id), 201),
+        '/workouts': (lambda body, user_id: tracker.record_workout(**body, user_id=user_id), 201),
+        '/goal': (lambda body, user_id: tracker.set_goal(**body, user_id=user_id), 201),
+        '/profile': (lambda body, user_id: tracker.set_profile(**body, user_id=user_id), 200),
+    }
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        if url.path == '/metrics':
+            body = tracker.metrics_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path in self.GET_ROUTES:
+            self._respond(lambda: self.GET_ROUTES[url.path](query, self._user_id()))
+        elif url.path.startswith('/recipes/'):
+            self._respond(lambda: tracker.get_recipe(url.path[len('/recipes/'):], self._user_id()))
+        else:
+            self._send_json(404, {'error': 'Not found.'})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'Request body must be JSON.'})
+            return
+        if not isinstance(body, dict):
+            self._send_json(400, {'error': 'Request body must be a JSON object.'})
+        elif url.path in self.POST_ROUTES:
+            service, status = self.POST_ROUTES[url.path]
+            self._respond(lambda: service(body, self._user_id()), status)
+        else:
+            self._send_json(404, {'error': 'Not found.'})
+
+    def _user_id(self):
+        value = self.headers.get('X-User-Id')
+        if value is None:
+            return tracker.DEFAULT_USER_ID
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError("X-User-Id must be a whole number.") from None
+
+    def _respond(self, call, status=200):
+        try:
+            result = call()
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+        except sqlite3.OperationalError as e:
+            self._send_json(503, {'error': f"Database busy or unavailable: {e}"})
+        except Exception as e:
+            self._send_json(500, {'error': f"Internal error: {e}"})
+        else:
+            if result is None:
+                self._send_json(404, {'error': 'Not found.'})
+            elif isinstance(result, dict) and result.get('queued'):
+                self._send_json(202, result)
+            else:
+                self._send_json(status, result)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Function to run the HTTP server until interrupted (write_behind=True queues meal, workout and weight inserts;
+# metrics=True turns on instrumentation, and metrics_dump also appends a JSON snapshot to that file every minute;
+# vacuum=True frees unused database pages a few at a time in the background)
+def serve(host='127.0.0.1', port=8000, write_behind=False, metrics=False, metrics_dump=None, vacuum=False):
+    if metrics or metrics_dump:
+        tracker.enable_metrics()
+    if metrics_dump:
+        tracker.start_metrics_dump(metrics_dump)
+    if write_behind:
+        tracker.start_write_behind()
+    if vacuum:
+        tracker.start_vacuum_schedule()
+    server = TrackerHTTPServer((host, port), TrackerRequestHandler)
+    print(f"Serving the Fitness Tracker API on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        tracker.stop_vacuum_schedule()
+        tracker.stop_write_behind()
+        tracker.stop_metrics_dump()
+        tracker.close_db_pool()
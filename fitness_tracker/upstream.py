@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import time
+import urllib.parse
+
+# Shared asyncio client for the remote APIs (USDA FoodData Central, wger). Every thread's calls run on one
+# event loop in a background thread, so these limits hold for the whole process:
+#   - rate limiting: a token bucket per host keeps requests under the upstream's limit. A request that would
+#     wait longer than max_wait for a token fails at once as 'rate_limited' instead of holding up its caller,
+#     and a 429 answer stops the host for its Retry-After time.
+#   - coalescing: identical requests already in flight are sent once and every caller gets that answer.
+#   - circuit breaking: after `failures` failures in a row (network errors, timeouts, 429 and 5xx answers) a host
+#     is skipped for `open_seconds`; then a single trial request decides whether it is back.
+# Calls never raise: each returns a result dict
+#   {'ok': bool, 'status': HTTP status or None, 'data': parsed JSON or None, 'error': message or None,
+#    'reason': None, 'http_error', 'timeout', 'network_error', 'bad_response', 'rate_limited' or 'circuit_open'}
+# Requests are sent by a blocking transport(url, params, timeout) that returns a requests-style response
+# (the tracker passes http_get, whose session keeps connections alive), run on the loop's thread pool.
+
+# (requests per second, burst size, failures before the circuit opens, seconds it stays open)
+DEFAULT_HOST_LIMITS = (5.0, 10, 3, 60)
+
+# A token bucket: `rate` tokens a second, at most `burst` saved up
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    # Function to take a token; returns how long to wait before using it, or None (nothing taken)
+    # if that would be longer than max_wait
+    def reserve(self, max_wait):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0)
+        if wait > max_wait:
+            return None
+        self.tokens -= 1  # may go negative: the token is promised to this request
+        return wait
+
+    # Function to hold every request back for a while (after a 429)
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+# A circuit breaker: 'closed' (requests go through), 'open' (they fail at once) or 'half_open' (one trial request)
+class CircuitBreaker:
+    def __init__(self, failure_threshold, open_seconds):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+
+    # Function to decide whether a request may go out now
+    def allow(self):
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = 'half_open'
+            return True  # the trial request
+        return self.state == 'closed'
+
+    def record(self, success):
+        if success:
+            self.state, self.failures = 'closed', 0
+            return
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            self.state, self.opened_at = 'open', time.monotonic()
+
+def _result(ok=False, status=None, data=None, error=None, reason=None):
+    return {'ok': ok, 'status': status, 'data': data, 'error': error, 'reason': reason}
+
+class UpstreamClient:
+    # host_limits: {host: (rate, burst, failures, open_seconds)}; other hosts get DEFAULT_HOST_LIMITS
+    def __init__(self, transport, host_limits=None, max_wait=2.0, workers=8):
+        self.transport = transport
+        self.host_limits = dict(host_limits or {})
+        self.max_wait = max_wait
+        self.workers = workers
+        self.buckets = {}
+        self.breakers = {}
+        self.in_flight = {}  # request key -> task answering it
+        self.stats = {}  # host -> {event: count}
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # Function to start the event loop thread (once)
+    def start(self):
+        with self._lock:
+            if self._loop is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._loop = asyncio.new_event_loop()
+                self._loop.set_default_executor(ThreadPoolExecutor(self.workers, thread_name_prefix='upstream'))
+                self._thread = threading.Thread(target=self._loop.run_forever, name='upstream-loop', daemon=True)
+                self._thread.start()
+        return self._loop
+
+    # Function to stop the event loop thread; waits for requests in flight
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(loop.shutdown_default_executor(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+            loop.close()
+
+    def _count(self, host, event):
+        host_stats = self.stats.setdefault(host, {})
+        host_stats[event] = host_stats.get(event, 0) + 1
+
+    # Function to get the token bucket and circuit breaker for a host
+    def _limits(self, host):
+        if host not in self.buckets:
+            rate, burst, failures, open_seconds = self.host_limits.get(host, DEFAULT_HOST_LIMITS)
+            self.buckets[host] = TokenBucket(rate, burst)
+            self.breakers[host] = CircuitBreaker(failures, open_seconds)
+        return self.buckets[host], self.breakers[host]
+
+    # Function to GET a URL (from a coroutine on the client's loop); identical requests in flight share one answer
+    async def get(self, url, params=None, timeout=None):
+        key = (url, tuple(sorted((params or {}).items())))
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(url, params, timeout))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self._count(urllib.parse.urlsplit(url).hostname or '', 'coalesced')
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url, params, timeout):
+        host = urllib.parse.urlsplit(url).hostname or ''
+        bucket, breaker = self._limits(host)
+        if not breaker.allow():
+            self._count(host, 'circuit_open')
+            return _result(error=f"{host} is unavailable (circuit open).", reason='circuit_open')
+        wait = bucket.reserve(self.max_wait)
+        if wait is None:
+            self._count(host, 'rate_limited')
+            if breaker.state == 'half_open':
+                breaker.state = 'open'  # the trial didn't happen; try again later
+            return _result(error=f"Rate limit for {host} reached; try again shortly.", reason='rate_limited')
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        self._count(host, 'requests')
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.transport(url, params=params, timeout=timeout))
+        except Exception as e:
+            breaker.record(False)
+            timed_out = any(cls is TimeoutError or cls.__name__.endswith('Timeout') for cls in type(e).__mro__)
+            self._count(host, 'timeout' if timed_out else 'network_error')
+            return _result(error=f"{host}: {e}", reason='timeout' if timed_out else 'network_error')
+
+        status = response.status_code
+        if status == 429:
+            retry_after = response.headers.get('Retry-After', '')
+            bucket.block(float(retry_after) if retry_after.replace('.', '', 1).isdigit() else 1.0)
+        # 429 and 5xx mean the host is in trouble; other errors (404, 400) are answers about this request
+        breaker.record(status != 429 and status < 500)
+        if status >= 400:
+            self._count(host, 'http_error')
+            return _result(status=status, error=f"{host} answered HTTP {status}.",
+                           reason='rate_limited' if status == 429 else 'http_error')
+        try:
+            data = response.json()
+        except ValueError as e:
+            self._count(host, 'bad_response')
+            return _result(status=status, error=f"{host} sent an unreadable answer: {e}", reason='bad_response')
+        return _result(ok=True, status=status, data=data)
+
+    # Function to GET a URL from ordinary (non-async) code; blocks until the result is in
+    def get_sync(self, url, params=None, timeout=None):
+        return asyncio.run_coroutine_threadsafe(self.get(url, params, timeout), self.start()).result()
+
+    # Function to GET many (url, params) pairs at once from ordinary code; results come back in the same order
+    def get_many_sync(self, requests, timeout=None):
+        async def get_all():
+            return await asyncio.gather(*(self.get(url, params, timeout) for url, params in requests))
+        return asyncio.run_coroutine_threadsafe(get_all(), self.start()).result()
+
+    # Function to describe every host: circuit state and counters
+    def host_stats(self):
+        return {host: {'circuit': breaker.state, **self.stats.get(host, {})} for host, breaker in list(self.breakers.items())}
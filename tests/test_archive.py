@@ -0,0 +1,87 @@
+# Tests for archiving old meals and workouts, and for importing files again after an archive.
+# Run with: python -m pytest tests
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fitness_tracker import tracker
+
+DAY = '2020-01-01'  # long before any retention period
+
+class ArchiveReimportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved_paths = tracker.DB_PATH, tracker.DB_SHARD_PATHS
+        tracker.close_db_pool()
+        tracker.DB_PATH = os.path.join(self.directory.name, 'fitness_tracker.db')
+        tracker.DB_SHARD_PATHS = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker.setup_database()
+
+    def tearDown(self):
+        tracker.close_db_pool()
+        tracker.DB_PATH, tracker.DB_SHARD_PATHS = self.saved_paths
+        self.directory.cleanup()
+
+    # Function to write `text` to a file in the test directory; returns its path
+    def write_file(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+        return path
+
+    def summary(self):
+        return [row[:9] for row in tracker.get_daily_summary(DAY, DAY)]
+
+    def test_meals_archived_then_imported_again_are_skipped(self):
+        path = self.write_file('meals.csv', 'name,calories,protein,carbs,fats,logged_at\n'
+                                            f'Porridge,100,5,15,2,{DAY} 08:00:00\n'
+                                            f'Soup,250,10,20,8,{DAY} 12:30:00\n')
+        self.assertEqual(tracker.bulk_import('meals', path, progress=None)['imported'], 2)
+        before = self.summary()
+        self.assertEqual(before[0][1], 350)
+
+        self.assertEqual(tracker.archive_old_rows(365)['meals'], 2)
+        report = tracker.bulk_import('meals', path, progress=None)
+        self.assertEqual((report['imported'], report['duplicates']), (0, 2))
+        self.assertEqual(self.summary(), before)
+        self.assertEqual(tracker.verify_daily_summary(), [])
+
+        # A new meal on an archived day is still imported
+        path = self.write_file('more.csv', f'name,calories,logged_at\nApple,50,{DAY} 16:00:00\n')
+        self.assertEqual(tracker.bulk_import('meals', path, progress=None)['imported'], 1)
+        self.assertEqual(self.summary()[0][1], 400)
+        self.assertEqual(tracker.verify_daily_summary(), [])
+
+    def test_workouts_archived_then_imported_again_are_skipped(self):
+        workout = {'date': DAY, 'total_calories_burned': 120.5,
+                   'exercises': [{'name': 'squat', 'duration': 10, 'calories_burned': 120.5}]}
+        path = self.write_file('workouts.jsonl', json.dumps(workout) + '\n')
+        self.assertEqual(tracker.bulk_import('workouts', path, progress=None)['imported'], 1)
+        before = self.summary()
+
+        self.assertEqual(tracker.archive_old_rows(365)['workouts'], 1)
+        report = tracker.bulk_import('workouts', path, progress=None)
+        self.assertEqual((report['imported'], report['duplicates']), (0, 1))
+        self.assertEqual(self.summary(), before)
+        self.assertEqual(tracker.verify_daily_summary(), [])
+
+    def test_workout_plan_archived_then_imported_again_is_skipped(self):
+        session = {'date': DAY, 'weight_kg': 80, 'exercises': [{'name': 'squat', 'sets': 3, 'reps': 10}]}
+        path = self.write_file('plan.jsonl', json.dumps(session) + '\n')
+        self.assertEqual(tracker.import_workout_plan(path, progress=None)['imported'], 1)
+        before = self.summary()
+
+        tracker.archive_old_rows(365)
+        report = tracker.import_workout_plan(path, progress=None)
+        self.assertEqual((report['imported'], report['duplicates']), (0, 1))
+        self.assertEqual(self.summary(), before)
+        self.assertEqual(tracker.verify_daily_summary(), [])
+
+if __name__ == '__main__':
+    unittest.main()
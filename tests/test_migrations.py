@@ -0,0 +1,169 @@
+# Tests for the schema migrations: a database made by the original single-file program is upgraded
+# to the current schema version with its data intact.
+# Run with: python -m pytest tests
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fitness_tracker import tracker
+
+# The schema setup_database created before versioned migrations (PRAGMA user_version 0)
+BASELINE_SCHEMA = '''
+    CREATE TABLE meals (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        calories REAL,
+        protein REAL,
+        carbs REAL,
+        fats REAL,
+        logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE workouts (
+        id INTEGER PRIMARY KEY,
+        date TEXT,
+        total_calories_burned REAL
+    );
+    CREATE TABLE workout_exercises (
+        id INTEGER PRIMARY KEY,
+        workout_id INTEGER,
+        name TEXT,
+        duration INTEGER,
+        calories_burned REAL,
+        FOREIGN KEY (workout_id) REFERENCES workouts(id)
+    );
+    CREATE TABLE recipes (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        ingredients TEXT,
+        calories REAL,
+        protein REAL,
+        carbs REAL,
+        fats REAL
+    );
+    CREATE TABLE weight_history (
+        id INTEGER PRIMARY KEY,
+        date TEXT,
+        weight REAL
+    );
+    CREATE TABLE goal_information (
+        id INTEGER PRIMARY KEY,
+        current_weight REAL,
+        goal_weight REAL,
+        goal_protein_ratio REAL,
+        calories_difference REAL,
+        protein_difference REAL
+    );
+'''
+
+# Rows as the original program wrote them (logged_at was sometimes stored with a 'T')
+BASELINE_MEALS = [
+    ('Porridge', 300, 10, 50, 6, '2024-03-01 08:00:00'),
+    ('Chicken salad', 450, 40, 20, 18, '2024-03-01T12:30:00'),
+    ('Pasta', 700, 25, 110, 15, '2024-03-02 19:00:00'),
+]
+BASELINE_WORKOUTS = [
+    ('2024-03-01', 250.0, [('squat', 15, 150.0), ('bench press', 10, 100.0)]),
+    ('2024-03-02', 80.0, [('push up', 8, 80.0)]),
+]
+BASELINE_WEIGHTS = [('2024-03-01', 82.0), ('2024-03-02', 81.6)]
+BASELINE_RECIPE = ('Chicken rice bowl', '200g rice,150g chicken breast', 520, 45, 60, 9)
+BASELINE_GOAL = (81.6, 75.0, 1.8, -500.0, 20.0)
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved_paths = tracker.DB_PATH, tracker.DB_SHARD_PATHS
+        tracker.close_db_pool()
+        tracker.DB_PATH = os.path.join(self.directory.name, 'fitness_tracker.db')
+        tracker.DB_SHARD_PATHS = []
+        self.make_baseline_database(tracker.DB_PATH)
+
+    def tearDown(self):
+        tracker.close_db_pool()
+        tracker.DB_PATH, tracker.DB_SHARD_PATHS = self.saved_paths
+        self.directory.cleanup()
+
+    def make_baseline_database(self, path):
+        conn = sqlite3.connect(path)
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany('INSERT INTO meals (name, calories, protein, carbs, fats, logged_at) VALUES (?, ?, ?, ?, ?, ?)',
+                         BASELINE_MEALS)
+        for date, total, exercises in BASELINE_WORKOUTS:
+            workout_id = conn.execute('INSERT INTO workouts (date, total_calories_burned) VALUES (?, ?)',
+                                      (date, total)).lastrowid
+            conn.executemany('INSERT INTO workout_exercises (workout_id, name, duration, calories_burned) VALUES (?, ?, ?, ?)',
+                             [(workout_id, *exercise) for exercise in exercises])
+        conn.executemany('INSERT INTO weight_history (date, weight) VALUES (?, ?)', BASELINE_WEIGHTS)
+        conn.execute('INSERT INTO recipes (name, ingredients, calories, protein, carbs, fats) VALUES (?, ?, ?, ?, ?, ?)',
+                     BASELINE_RECIPE)
+        conn.execute('''INSERT INTO goal_information (current_weight, goal_weight, goal_protein_ratio,
+                                                      calories_difference, protein_difference) VALUES (?, ?, ?, ?, ?)''',
+                     BASELINE_GOAL)
+        conn.commit()
+        conn.close()
+
+    def migrate(self):
+        with tracker.db_connection() as conn:
+            tracker.migrate_database(conn)
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def test_baseline_database_upgrades_to_the_current_version(self):
+        self.assertEqual(self.migrate(), len(tracker.MIGRATIONS))
+        # A second run finds nothing to do
+        self.assertEqual(self.migrate(), len(tracker.MIGRATIONS))
+
+    def test_upgrade_keeps_the_data(self):
+        self.migrate()
+        user_id = tracker.DEFAULT_USER_ID
+
+        meals = tracker.list_meals(limit=10, user_id=user_id)['items']
+        self.assertEqual([(meal['name'], meal['calories'], meal['logged_at']) for meal in meals],
+                         [('Porridge', 300, '2024-03-01 08:00:00'), ('Chicken salad', 450, '2024-03-01 12:30:00'),
+                          ('Pasta', 700, '2024-03-02 19:00:00')])
+        weights = tracker.list_weights(limit=10, user_id=user_id)['items']
+        self.assertEqual([(weight['date'], weight['weight']) for weight in weights], BASELINE_WEIGHTS[::-1])
+        with tracker.db_connection() as conn:
+            workouts = conn.execute('''
+                SELECT w.date, w.total_calories_burned, e.name, e.duration, e.calories_burned, w.user_id
+                FROM workouts w JOIN workout_exercises e ON e.workout_id = w.id ORDER BY w.id, e.id
+            ''').fetchall()
+        self.assertEqual(workouts, [(date, total, *exercise, user_id)
+                                    for date, total, exercises in BASELINE_WORKOUTS for exercise in exercises])
+
+        recipe = tracker.list_recipes(user_id=user_id)['items'][0]
+        self.assertEqual(tuple(recipe[field] for field in ('name', 'ingredients', 'calories', 'protein', 'carbs', 'fats')),
+                         BASELINE_RECIPE)
+        self.assertEqual([found['name'] for found in tracker.search_recipes('chicken', user_id=user_id)['items']],
+                         [BASELINE_RECIPE[0]])
+        with tracker.db_connection() as conn:
+            goal = conn.execute('''
+                SELECT current_weight, goal_weight, goal_protein_ratio, calories_difference, protein_difference
+                FROM goal_information WHERE user_id = ?
+            ''', (user_id,)).fetchone()
+        self.assertEqual(goal, BASELINE_GOAL)
+
+    def test_upgrade_builds_a_matching_daily_summary(self):
+        self.migrate()
+        summary = tracker.list_daily_summary(user_id=tracker.DEFAULT_USER_ID)['items']
+        self.assertEqual([(day['day'], day['calories'], day['meal_count'], day['calories_burned'],
+                           day['workout_count'], day['latest_weight']) for day in summary],
+                         [('2024-03-01', 750, 2, 250, 1, 82.0), ('2024-03-02', 700, 1, 80, 1, 81.6)])
+        self.assertEqual(tracker.verify_daily_summary(), [])
+
+        tracker.rebuild_daily_summary()
+        self.assertEqual(tracker.list_daily_summary(user_id=tracker.DEFAULT_USER_ID)['items'], summary)
+
+    def test_setup_database_upgrades_every_file(self):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            tracker.setup_database()
+        self.assertIn('completed successfully', output.getvalue())
+        with tracker.db_connection() as conn:
+            self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], len(tracker.MIGRATIONS))
+
+if __name__ == '__main__':
+    unittest.main()
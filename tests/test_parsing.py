@@ -0,0 +1,37 @@
+# Tests for parsing recipe ingredient lines into grams and a food name.
+# Run with: python -m pytest tests
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fitness_tracker import tracker
+
+class IngredientParsingTest(unittest.TestCase):
+    def test_weights_volumes_and_counts(self):
+        cases = {
+            '200g rice': (200.0, 'rice'),
+            '1.5 kg potatoes': (1500.0, 'potatoes'),
+            '1/2 cup oats': (120.0, 'oats'),
+            '1 1/2 cups of milk': (360.0, 'milk'),
+            '2 tbsp peanut butter': (30.0, 'peanut butter'),
+            '2 eggs': (100.0, 'eggs'),
+            '3 Large  EGGS': (150.0, 'large eggs'),
+            '1 banana': (118.0, 'banana'),
+            '2 pickles': (200.0, 'pickles'),  # not in INGREDIENT_PIECE_GRAMS: 100 g each
+            'salt': (100.0, 'salt'),
+        }
+        for line, expected in cases.items():
+            with self.subTest(line=line):
+                grams, name = tracker.parse_ingredient_line(line)
+                self.assertAlmostEqual(grams, expected[0])
+                self.assertEqual(name, expected[1])
+
+    def test_invalid_lines_are_rejected(self):
+        for line in ('', '   ', '0 g rice', '1/0 cup oats', '200 g', '3'):
+            with self.subTest(line=line):
+                with self.assertRaises(ValueError):
+                    tracker.parse_ingredient_line(line)
+
+if __name__ == '__main__':
+    unittest.main()
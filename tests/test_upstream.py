@@ -0,0 +1,197 @@
+# Tests for the shared upstream client, against a local mock of the USDA search API over real HTTP.
+# Run with: python -m pytest tests
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fitness_tracker import tracker
+from fitness_tracker.upstream import UpstreamClient
+
+HOST = '127.0.0.1'
+
+# The mock upstream: answers every search after `latency` seconds, or fails with the status in `mode`
+class MockUpstream(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mode = 'ok'  # 'ok', '503' or '429'
+    latency = 0.0
+    hits = []  # query of every request that reached the mock
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get('query', [''])[0]
+        MockUpstream.hits.append(query)
+        time.sleep(self.latency)
+        if self.mode == 'ok':
+            status, body = 200, json.dumps({'foods': [{'fdcId': 1, 'description': query, 'foodNutrients': []}]})
+        else:
+            status, body = int(self.mode), json.dumps({'error': 'unavailable'})
+        body = body.encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class UpstreamClientTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer((HOST, 0), MockUpstream)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://{HOST}:{cls.server.server_port}/fdc/v1/foods/search"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        MockUpstream.mode, MockUpstream.latency, MockUpstream.hits = 'ok', 0.0, []
+        self.session = requests.Session()  # no retries, so every call is exactly one request
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.session.close()
+
+    # Function to make a client for the mock host with (rate, burst, failures, open_seconds) limits
+    def make_client(self, limits, max_wait=2.0, transport=None):
+        client = UpstreamClient(transport or self.session.get, {HOST: limits}, max_wait=max_wait)
+        self.clients.append(client)
+        return client
+
+    def test_identical_requests_in_flight_are_sent_once(self):
+        MockUpstream.latency = 0.2
+        client = self.make_client((1000.0, 1000, 3, 60))
+        results = client.get_many_sync([(self.url, {'query': 'milk'})] * 20 + [(self.url, {'query': 'eggs'})] * 5, 5)
+
+        self.assertTrue(all(result['ok'] for result in results))
+        self.assertEqual(sorted(MockUpstream.hits), ['eggs', 'milk'])
+        self.assertEqual({result['data']['foods'][0]['description'] for result in results[:20]}, {'milk'})
+        self.assertEqual(client.host_stats()[HOST]['coalesced'], 23)
+
+    def test_requests_beyond_the_token_bucket_are_rejected(self):
+        client = self.make_client((1.0, 2, 3, 60), max_wait=0.1)
+        results = client.get_many_sync([(self.url, {'query': f"food {n}"}) for n in range(5)], 5)
+
+        self.assertEqual(sum(result['ok'] for result in results), 2)
+        self.assertEqual([result['reason'] for result in results if not result['ok']], ['rate_limited'] * 3)
+        self.assertEqual(len(MockUpstream.hits), 2)
+        self.assertEqual(client.host_stats()[HOST]['rate_limited'], 3)
+
+    def test_429_blocks_the_host_for_its_retry_after_time(self):
+        MockUpstream.mode = '429'
+        client = self.make_client((1000.0, 1000, 5, 60), max_wait=0.5)
+        first = client.get_sync(self.url, {'query': 'food'}, 5)
+        self.assertEqual((first['reason'], first['status']), ('rate_limited', 429))
+
+        # Retry-After is 1 second, longer than max_wait: the next call fails without reaching the upstream
+        blocked = client.get_sync(self.url, {'query': 'other food'}, 5)
+        self.assertEqual((blocked['reason'], blocked['status']), ('rate_limited', None))
+        self.assertEqual(MockUpstream.hits, ['food'])
+
+        MockUpstream.mode = 'ok'
+        time.sleep(1.1)
+        self.assertTrue(client.get_sync(self.url, {'query': 'other food'}, 5)['ok'])
+        self.assertEqual(MockUpstream.hits, ['food', 'other food'])
+
+    def test_circuit_opens_then_half_opens_then_closes(self):
+        states = []  # the circuit state each time a request actually went out
+
+        def transport(url, params=None, timeout=None):
+            states.append(client.breakers[HOST].state)
+            return self.session.get(url, params=params, timeout=timeout)
+
+        MockUpstream.mode = '503'
+        client = self.make_client((1000.0, 1000, 3, 0.3), transport=transport)
+        for n in range(3):
+            self.assertEqual(client.get_sync(self.url, {'query': f"food {n}"}, 5)['reason'], 'http_error')
+        self.assertEqual(client.host_stats()[HOST]['circuit'], 'open')
+
+        # Open: calls fail at once without reaching the upstream
+        self.assertEqual(client.get_sync(self.url, {'query': 'food 3'}, 5)['reason'], 'circuit_open')
+        self.assertEqual(len(MockUpstream.hits), 3)
+
+        # After open_seconds one trial goes out; a failed trial opens the circuit again
+        time.sleep(0.35)
+        self.assertEqual(client.get_sync(self.url, {'query': 'food 4'}, 5)['reason'], 'http_error')
+        self.assertEqual(states[-1], 'half_open')
+        self.assertEqual(client.host_stats()[HOST]['circuit'], 'open')
+        self.assertEqual(client.get_sync(self.url, {'query': 'food 5'}, 5)['reason'], 'circuit_open')
+
+        # A successful trial closes it
+        MockUpstream.mode = 'ok'
+        time.sleep(0.35)
+        self.assertTrue(client.get_sync(self.url, {'query': 'food 6'}, 5)['ok'])
+        self.assertEqual(states[-1], 'half_open')
+        self.assertEqual(client.host_stats()[HOST]['circuit'], 'closed')
+        self.assertTrue(client.get_sync(self.url, {'query': 'food 7'}, 5)['ok'])
+        self.assertEqual(states, ['closed'] * 3 + ['half_open', 'half_open', 'closed'])
+
+# A host that accepts connections and never answers
+class HungHost:
+    def __init__(self):
+        self.listener = socket.create_server((HOST, 0))
+        self.connections = []
+        threading.Thread(target=self._accept, daemon=True).start()
+        self.url = f"http://{HOST}:{self.listener.getsockname()[1]}/api/v2/exercise/"
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            self.connections.append(connection)
+
+    def close(self):
+        self.listener.close()
+        for connection in self.connections:
+            connection.close()
+
+class HungHostTest(unittest.TestCase):
+    TIMEOUT = (0.5, 0.5)  # (connect, read) seconds
+
+    def setUp(self):
+        self.host = HungHost()
+        # The tracker's own transport and session, as used for the USDA and wger lookups
+        self.client = UpstreamClient(tracker.http_get, {HOST: (1000.0, 1000, 2, 60)})
+
+    def tearDown(self):
+        self.client.close()
+        self.host.close()
+
+    def test_hung_host_fails_within_the_timeout_budget(self):
+        start = time.monotonic()
+        result = self.client.get_sync(self.host.url, {'name': 'unknown exercise'}, self.TIMEOUT)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(result['reason'], 'timeout')
+        self.assertLess(elapsed, sum(self.TIMEOUT) + 0.5)
+        self.assertEqual(len(self.host.connections), 1)  # no retries behind the client's back
+
+    def test_hung_host_opens_the_circuit_after_its_failures(self):
+        for n in range(2):
+            self.assertEqual(self.client.get_sync(self.host.url, {'name': f"exercise {n}"}, self.TIMEOUT)['reason'],
+                             'timeout')
+        start = time.monotonic()
+        self.assertEqual(self.client.get_sync(self.host.url, {'name': 'exercise 2'}, self.TIMEOUT)['reason'],
+                         'circuit_open')
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(len(self.host.connections), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# Tests for write-behind mode: queued writes, read-your-writes and shutdown.
+# Run with: python -m pytest tests
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fitness_tracker import tracker
+
+MEAL = {'name': 'Porridge', 'calories': 300, 'protein': 10, 'carbs': 50, 'fats': 6}
+
+class WriteBehindTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved_paths = tracker.DB_PATH, tracker.DB_SHARD_PATHS
+        tracker.close_db_pool()
+        tracker.DB_PATH = os.path.join(self.directory.name, 'fitness_tracker.db')
+        tracker.DB_SHARD_PATHS = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker.setup_database()
+        tracker.start_write_behind()
+
+    def tearDown(self):
+        tracker.stop_write_behind()
+        tracker.close_db_pool()
+        tracker.DB_PATH, tracker.DB_SHARD_PATHS = self.saved_paths
+        self.directory.cleanup()
+
+    def meal_count(self):
+        with tracker.db_connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM meals').fetchone()[0]
+
+    def test_queued_writes_are_read_back_by_their_user(self):
+        for _ in range(50):
+            self.assertTrue(tracker.record_meal(**MEAL)['queued'])
+        self.assertEqual(len(tracker.list_meals(limit=100)['items']), 50)
+
+    def test_stop_commits_every_queued_write(self):
+        for _ in range(50):
+            tracker.record_meal(**MEAL)
+        tracker.stop_write_behind()
+        self.assertEqual(self.meal_count(), 50)
+
+    def test_writes_after_stop_are_made_by_the_caller(self):
+        writer = tracker._write_behind
+        tracker.record_meal(**MEAL)
+        tracker.stop_write_behind()
+        self.assertFalse(writer.submit(tracker.DEFAULT_USER_ID, lambda cursor: None))
+
+        # A caller that picked up the writer just before it stopped still gets its write made
+        tracker._write_behind = writer
+        try:
+            meal = tracker.record_meal(**MEAL)
+        finally:
+            tracker._write_behind = None
+        self.assertNotIn('queued', meal)
+        self.assertIsNotNone(meal['id'])
+        self.assertEqual(self.meal_count(), 2)
+
+if __name__ == '__main__':
+    unittest.main()